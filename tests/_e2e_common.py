@@ -0,0 +1,236 @@
+"""
+Helpers shared by the e2e runners: process management, PTY pairs via socat,
+readiness waits and the register/coil layout served by both
+tests/modbus_mock_server.py and tests/modbus_server_harness.go.
+"""
+
+import os
+import select
+import selectors
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+HOLDING_BASE = (0x1111, 0x2222, 0x1234, 0xABCD, 0x0000, 0x7FFF, 0x8000)
+HOLDING_EXTRA = tuple(0x1000 + i for i in range(130))
+HOLDING_DATA = HOLDING_BASE + HOLDING_EXTRA
+INPUT_DATA = (0x9999, 0xAAAA, 0xBBBB, 0xCCCC)
+COILS_DATA = (True, False, True, True, False, False, True, False)
+DISCRETE_DATA = (False, True, True, False, True, False, False, True)
+
+
+def require_cmd(cmd: str) -> None:
+    if shutil.which(cmd) is None:
+        raise SystemExit(f"Missing required command: {cmd}")
+
+
+def _wait_pidfd(pid: int, timeout: float) -> bool:
+    # pidfd becomes readable once the child exits, so there is no poll interval.
+    fd = os.pidfd_open(pid)
+    try:
+        readable, _, _ = select.select([fd], [], [], timeout)
+    finally:
+        os.close(fd)
+    return bool(readable)
+
+
+def _wait_exit(proc: subprocess.Popen, timeout: float) -> bool:
+    try:
+        exited = _wait_pidfd(proc.pid, timeout)
+    except (AttributeError, OSError):
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        return True
+    if exited:
+        proc.wait()
+    return exited
+
+
+def kill_process(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        except Exception:
+            proc.terminate()
+        if not _wait_exit(proc, 2):
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except Exception:
+                proc.kill()
+
+
+def _sleep_until_exit(proc: subprocess.Popen, pidfd: int | None, interval: float) -> bool:
+    if pidfd is None:
+        time.sleep(interval)
+        return proc.poll() is not None
+    readable, _, _ = select.select([pidfd], [], [], interval)
+    if readable:
+        proc.wait()
+        return True
+    return False
+
+
+def wait_for_proc_ready(check, proc: subprocess.Popen, timeout: float, label: str) -> None:
+    deadline = time.time() + timeout
+    last_err: Exception | None = None
+    try:
+        # Waiting on the pidfd notices a crash during startup immediately.
+        pidfd: int | None = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        pidfd = None
+
+    try:
+        exited = proc.poll() is not None
+        while time.time() < deadline:
+            if exited:
+                raise RuntimeError(f"{label} exited with code {proc.returncode}")
+            try:
+                if check():
+                    return
+            except Exception as exc:  # pylint: disable=broad-except
+                last_err = exc
+            exited = _sleep_until_exit(proc, pidfd, 0.1)
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+    if last_err is not None:
+        raise RuntimeError(f"{label} did not become ready in time: {last_err}") from last_err
+    raise RuntimeError(f"{label} did not become ready in time")
+
+
+def wait_for_ready_line(proc: subprocess.Popen, timeout: float, label: str) -> None:
+    # The server prints "READY ..." once it is reachable; EOF means it exited.
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise RuntimeError(f"{label} did not become ready in time")
+        readable, _, _ = select.select([proc.stdout], [], [], remaining)
+        if not readable:
+            continue
+        line = proc.stdout.readline().decode(errors="replace")
+        if not line:
+            proc.wait()
+            raise RuntimeError(f"{label} exited with code {proc.returncode}")
+        if line.startswith("READY"):
+            # Keep forwarding the server's log output (the Go library logs to
+            # stdout); an unread pipe would hide it and eventually block the
+            # server once it fills up.
+            threading.Thread(target=_forward_output, args=(proc.stdout,), daemon=True).start()
+            return
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def _forward_output(stream) -> None:
+    for raw in iter(stream.readline, b""):
+        sys.stdout.write(raw.decode(errors="replace"))
+        sys.stdout.flush()
+
+
+def cpu_pair() -> tuple[int | None, int | None]:
+    # Two distinct CPUs for the TCP server and this process (plus the clients
+    # it spawns); (None, None) when pinning is not possible.
+    if not hasattr(os, "sched_setaffinity"):
+        return None, None
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < 2:
+        return None, None
+    return cpus[0], cpus[1]
+
+
+def pin_preexec(cpu: int | None):
+    # Pin the child before exec, so every thread it starts (e.g. the Go
+    # runtime's) inherits the mask; best effort, containers may not allow it.
+    if cpu is None:
+        return None
+
+    def _pin() -> None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError:
+            pass
+
+    return _pin
+
+
+def pin_self(cpu: int | None) -> set[int] | None:
+    # Returns the previous mask for restore_affinity, or None if unchanged.
+    if cpu is None:
+        return None
+    try:
+        saved = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, {cpu})
+    except OSError:
+        return None
+    return saved
+
+
+def restore_affinity(mask: set[int] | None) -> None:
+    if mask is None:
+        return
+    try:
+        os.sched_setaffinity(0, mask)
+    except OSError:
+        pass
+
+
+def sources_older_than(binary: Path, *src_dirs: Path) -> bool:
+    if not binary.exists():
+        return False
+    sources = [p for d in src_dirs for p in d.glob("*.go") if not p.name.endswith("_test.go")]
+    # a dependency bump alone must trigger a rebuild too
+    sources += [p for p in (ROOT / "go.mod", ROOT / "go.sum") if p.exists()]
+    src_mtime = max((p.stat().st_mtime for p in sources), default=0.0)
+    return binary.stat().st_mtime >= src_mtime
+
+
+def start_socat_pair() -> tuple[subprocess.Popen, str, str]:
+    require_cmd("socat")
+    print("[socat] creating connected pty pair")
+    proc = subprocess.Popen(
+        ["socat", "-d", "-d", "pty,raw,echo=0", "pty,raw,echo=0"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    # Read stderr in whatever chunks socat writes and split lines ourselves,
+    # so a partial line never blocks us.
+    fd = proc.stderr.fileno()
+    os.set_blocking(fd, False)
+    buf = bytearray()
+    devs: list[str] = []
+    deadline = time.time() + 5
+    with selectors.DefaultSelector() as sel:
+        sel.register(fd, selectors.EVENT_READ)
+        while len(devs) < 2 and time.time() < deadline:
+            if not sel.select(0.1):
+                continue
+            try:
+                chunk = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                break
+            buf += chunk
+            while len(devs) < 2 and (nl := buf.find(b"\n")) >= 0:
+                line = buf[:nl].decode(errors="replace")
+                del buf[: nl + 1]
+                if "PTY is" in line:
+                    devs.append(line.strip().split()[-1])
+    if len(devs) != 2:
+        kill_process(proc)
+        raise RuntimeError("failed to parse socat PTY paths")
+    print(f"[socat] pty pair: {devs[0]} <-> {devs[1]}")
+    return proc, devs[0], devs[1]
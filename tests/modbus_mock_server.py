@@ -12,9 +12,13 @@ Unit ID: configurable via --unit-id (default 1)
 - Discrete inputs (di):  [0,1,1,0,1,0,0,1] starting at address 0
 - Holding registers (hr): 0x1111, 0x2222, 0x1234, 0xabcd, 0x0000, 0x7fff, 0x8000
 - Input registers (ir):    0x9999, 0xaaaa, 0xbbbb, 0xcccc
+
+Prints "READY <address>" on stdout once the server is listening.
 """
 
+import asyncio
 import logging
+from functools import partial
 from typing import Tuple
 
 import click
@@ -23,17 +27,19 @@ from pymodbus.datastore import (
     ModbusServerContext,
     ModbusSlaveContext,
 )
-from pymodbus.server import StartSerialServer, StartTcpServer
+from pymodbus.server import ModbusSerialServer, ModbusTcpServer
 from pymodbus.transaction import ModbusAsciiFramer, ModbusRtuFramer, ModbusSocketFramer
 
 
 def build_context(unit_id: int) -> ModbusServerContext:
     coils = ModbusSequentialDataBlock(0, [1, 0, 1, 1, 0, 0, 1, 0])
     discretes = ModbusSequentialDataBlock(0, [0, 1, 1, 0, 1, 0, 0, 1])
-    base_holding = [0x1111, 0x2222, 0x1234, 0xABCD, 0x0000, 0x7FFF, 0x8000]
-    # add enough values to allow maximum-length register reads
-    extra_holding = [0x1000 + i for i in range(130)]
-    holding = ModbusSequentialDataBlock(0, base_holding + extra_holding)
+    holding_vals = [
+        0x1111, 0x2222, 0x1234, 0xABCD, 0x0000, 0x7FFF, 0x8000,
+        # add enough values to allow maximum-length register reads
+        *(0x1000 + i for i in range(130)),
+    ]
+    holding = ModbusSequentialDataBlock(0, holding_vals)
     inputs = ModbusSequentialDataBlock(0, [0x9999, 0xAAAA, 0xBBBB, 0xCCCC])
 
     store = {
@@ -118,11 +124,13 @@ def main(
     if mode.lower() == "tcp":
         host, port = parse_host_port(listen)
         logging.info("Starting TCP server on %s:%s", host, port)
-        StartTcpServer(
-            context=context,
-            address=(host, port),
+        make_server = partial(
+            ModbusTcpServer,
+            context,
             framer=ModbusSocketFramer,
+            address=(host, port),
         )
+        asyncio.run(serve(make_server, f"{host}:{port}"))
         return
 
     framer = ModbusAsciiFramer if framing.lower() == "ascii" else ModbusRtuFramer
@@ -135,8 +143,9 @@ def main(
         parity,
         stop_bits,
     )
-    StartSerialServer(
-        context=context,
+    make_server = partial(
+        ModbusSerialServer,
+        context,
         framer=framer,
         port=serial_dev,
         timeout=timeout,
@@ -145,6 +154,17 @@ def main(
         parity=parity,
         stopbits=stop_bits,
     )
+    asyncio.run(serve(make_server, serial_dev))
+
+
+async def serve(make_server, where: str) -> None:
+    # The server has to be created inside the running loop.
+    server = make_server()
+    if not await server.listen():
+        raise SystemExit(f"failed to start server on {where}")
+    # Handshake for the e2e runners, which wait for this line on stdout.
+    print(f"READY {where}", flush=True)
+    await server.serving
 
 
 def parse_host_port(addr: str) -> Tuple[str, int]:
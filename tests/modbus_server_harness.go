@@ -2,6 +2,7 @@ package main
 
 import (
 	"flag"
+	"fmt"
 	"log"
 	"os"
 	"os/signal"
@@ -157,6 +158,9 @@ func main() {
 	}
 	defer server.Stop()
 
+	// handshake for the e2e runner, which waits for this line on stdout
+	fmt.Println("READY", url)
+
 	sigCh := make(chan os.Signal, 1)
 	signal.Notify(sigCh, syscall.SIGINT, syscall.SIGTERM)
 	<-sigCh
@@ -14,55 +14,68 @@ Usage:
 """
 
 import os
+import re
+import socket
 import subprocess
 import sys
-import time
+from functools import lru_cache
 from pathlib import Path
 
 import click
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from _e2e_common import (  # noqa: E402
+    COILS_DATA,
+    DISCRETE_DATA,
+    HOLDING_DATA,
+    INPUT_DATA,
+    cpu_pair,
+    kill_process,
+    pin_preexec,
+    pin_self,
+    require_cmd,
+    restore_affinity,
+    sources_older_than,
+    start_socat_pair,
+    wait_for_ready_line,
+)
+
 ROOT = Path(__file__).resolve().parents[1]
 CLI = Path(os.environ.get("CLI", ROOT / "bin" / "modbus-cli"))
+# run_cli_and_check spawns the CLI once per check, so stringify these once.
+_CLI_STR = str(CLI)
+_ROOT_STR = str(ROOT)
+# The mock server is run with sys.executable rather than through its uvx
+# shebang: the runner's environment already carries the same PEP 723
+# dependencies, so spawning it never re-resolves them.
 SERVER_SCRIPT = ROOT / "tests" / "modbus_mock_server.py"
 
-
-def _require_cmd(cmd: str) -> None:
-    if subprocess.call(["which", cmd], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) != 0:
-        raise SystemExit(f"Missing required command: {cmd}")
+_REGISTER_LINE_RE = re.compile(r"^(0x[0-9a-fA-F]+)\s+\d+\s*:\s*(0x[0-9a-fA-F]+)\s+-?\d+")
+_BOOL_LINE_RE = re.compile(r"^(0x[0-9a-fA-F]+)\s+\d+\s*:\s*(true|false)\b", re.IGNORECASE)
 
 
 def _parse_register_line(line: str) -> tuple[int, int]:
     # expected format: 0x0000  0     : 0x1111  4369
-    parts = line.replace(":", " ").split()
-    if len(parts) < 4:
+    m = _REGISTER_LINE_RE.match(line)
+    if not m:
         raise ValueError(f"cannot parse register line: {line}")
-    addr_hex = parts[0]
-    value_hex = parts[2]
-    return int(addr_hex, 16), int(value_hex, 16)
-
-
-def _parse_registers(lines: list[str]) -> list[tuple[int, int]]:
-    return [_parse_register_line(ln) for ln in lines]
+    return int(m.group(1), 16), int(m.group(2), 16)
 
 
 def _parse_bool_line(line: str) -> tuple[int, bool]:
     # expected format: 0x0000  0     : true
-    parts = line.replace(":", " ").split()
-    if len(parts) < 3:
+    m = _BOOL_LINE_RE.match(line)
+    if not m:
         raise ValueError(f"cannot parse bool line: {line}")
-    addr_hex = parts[0]
-    value_str = parts[2].lower()
-    if value_str not in {"true", "false"}:
-        raise ValueError(f"unexpected bool value in line: {line}")
-    return int(addr_hex, 16), value_str == "true"
-
-
-def _parse_bools(lines: list[str]) -> list[tuple[int, bool]]:
-    return [_parse_bool_line(ln) for ln in lines]
+    return int(m.group(1), 16), m.group(2).lower() == "true"
 
 
 def build_cli() -> None:
-    if CLI.exists():
+    # A binary supplied through $CLI is used as-is.
+    if "CLI" in os.environ and CLI.exists():
+        return
+    # The CLI is built from cmd/ and the library package at the repo root.
+    if sources_older_than(CLI, ROOT / "cmd", ROOT):
         return
     print(f"[build] building modbus-cli at {CLI}")
     subprocess.check_call(
@@ -71,66 +84,26 @@ def build_cli() -> None:
     )
 
 
-def start_server_tcp(addr: str) -> subprocess.Popen:
-    print(f"[server] starting TCP mock on {addr}")
+def _start_mock(*args: str, cpu: int | None = None) -> subprocess.Popen:
     return subprocess.Popen(
-        [
-            sys.executable,
-            str(SERVER_SCRIPT),
-            "--mode",
-            "tcp",
-            "--listen",
-            addr,
-            "--unit-id",
-            "1",
-            "--log-level",
-            "ERROR",
-        ],
+        [sys.executable, str(SERVER_SCRIPT), *args, "--unit-id", "1", "--log-level", "ERROR"],
+        # own process group, so kill_process can signal the whole group
+        start_new_session=True,
+        preexec_fn=pin_preexec(cpu),
+        # unbuffered, so select() sees the READY line as soon as it is written
+        stdout=subprocess.PIPE,
+        bufsize=0,
     )
 
 
-def start_server_serial(device: str, framing: str) -> subprocess.Popen:
-    print(f"[server] starting serial mock on {device} framing={framing}")
-    return subprocess.Popen(
-        [
-            sys.executable,
-            str(SERVER_SCRIPT),
-            "--mode",
-            "serial",
-            "--framing",
-            framing,
-            "--serial",
-            device,
-            "--unit-id",
-            "1",
-            "--log-level",
-            "ERROR",
-        ],
-    )
-
+def start_server_tcp(addr: str, cpu: int | None = None) -> subprocess.Popen:
+    print(f"[server] starting TCP mock on {addr}")
+    return _start_mock("--mode", "tcp", "--listen", addr, cpu=cpu)
 
-def start_socat_pair() -> tuple[subprocess.Popen, str, str]:
-    _require_cmd("socat")
-    print("[socat] creating connected pty pair")
-    proc = subprocess.Popen(
-        ["socat", "-d", "-d", "pty,raw,echo=0", "pty,raw,echo=0"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
 
-    devs: list[str] = []
-    while len(devs) < 2:
-        line = proc.stderr.readline()
-        if not line:
-            break
-        if "PTY is" in line:
-            devs.append(line.strip().split()[-1])
-    if len(devs) != 2:
-        proc.kill()
-        raise RuntimeError("failed to obtain pty paths from socat")
-    print(f"[socat] pty pair: {devs[0]} <-> {devs[1]}")
-    return proc, devs[0], devs[1]
+def start_server_serial(device: str, framing: str) -> subprocess.Popen:
+    print(f"[server] starting serial mock on {device} framing={framing}")
+    return _start_mock("--mode", "serial", "--framing", framing, "--serial", device)
 
 
 def run_cli_and_check(
@@ -144,12 +117,26 @@ def run_cli_and_check(
     expected_bools: tuple[tuple[int, bool], ...] = (),
 ) -> None:
     print(f"[cli] running modbus-cli --target={target} {command}")
-    out = subprocess.check_output(
-        [str(CLI), "--target", target, command],
-        text=True,
-        cwd=ROOT,
-    )
-    lines = [ln.rstrip() for ln in out.strip().splitlines() if ln.strip()]
+    args = [_CLI_STR, "--target", target, command]
+    parse = _parse_bool_line if expected_bools else _parse_register_line
+    lines: list[str] = []
+    values: list = []
+    parse_err: ValueError | None = None
+    # Parse while streaming; a parse error is only raised after the output
+    # has been printed and the line checks below have run.
+    with subprocess.Popen(args, stdout=subprocess.PIPE, text=True, cwd=_ROOT_STR) as proc:
+        for raw in proc.stdout:
+            ln = raw.rstrip()
+            if not ln:
+                continue
+            lines.append(ln)
+            if parse_err is None:
+                try:
+                    values.append(parse(ln))
+                except ValueError as exc:
+                    parse_err = exc
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args)
     print(f"[cli] output for {target}:\n" + "\n".join(lines) + "\n")
 
     if expected_lines:
@@ -168,15 +155,18 @@ def run_cli_and_check(
             f"Expected {expected_len} lines for {target} {command}, got {len(lines)}"
         )
 
+    if parse_err is not None:
+        raise parse_err
+
     if expected_bools:
-        bools = _parse_bools(lines)
+        bools = values
         if bools != list(expected_bools):
             raise AssertionError(
                 f"Bool content mismatch for {target} {command}\nexpected: {expected_bools}\nactual: {bools}"
             )
         return
 
-    regs = _parse_registers(lines)
+    regs = values
 
     if expected_regs:
         if regs != list(expected_regs):
@@ -197,31 +187,16 @@ def run_cli_and_check(
             )
 
 
-def kill_process(proc: subprocess.Popen) -> None:
-    if proc.poll() is None:
-        proc.terminate()
-        try:
-            proc.wait(timeout=2)
-        except subprocess.TimeoutExpired:
-            proc.kill()
-
-
-HOLDING_BASE = (0x1111, 0x2222, 0x1234, 0xABCD, 0x0000, 0x7FFF, 0x8000)
-HOLDING_EXTRA = tuple(0x1000 + i for i in range(130))
-HOLDING_DATA = HOLDING_BASE + HOLDING_EXTRA
-INPUT_DATA = (0x9999, 0xAAAA, 0xBBBB, 0xCCCC)
-COILS_DATA = (True, False, True, True, False, False, True, False)
-DISCRETE_DATA = (False, True, True, False, True, False, False, True)
-
-
+@lru_cache(maxsize=64)
 def _expected_registers(data: tuple[int, ...], start: int, extra: int) -> tuple[tuple[int, int], ...]:
-    count = extra + 1
-    return tuple((start + idx, data[start + idx]) for idx in range(count))
+    end = start + extra + 1
+    return tuple(zip(range(start, end), data[start:end]))
 
 
+@lru_cache(maxsize=64)
 def _expected_bools(data: tuple[bool, ...], start: int, extra: int) -> tuple[tuple[int, bool], ...]:
-    count = extra + 1
-    return tuple((start + idx, data[start + idx]) for idx in range(count))
+    end = start + extra + 1
+    return tuple(zip(range(start, end), data[start:end]))
 
 
 def run_read_suite(target: str) -> None:
@@ -287,20 +262,40 @@ def run_read_suite(target: str) -> None:
     )
 
 
-def test_tcp() -> None:
-    proc = start_server_tcp("127.0.0.1:1502")
+def _tcp_accepting(host: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.1)
+        return sock.connect_ex((host, port)) == 0
+
+
+def test_tcp(keep_alive: bool = False) -> None:
+    host, port = "127.0.0.1", 1502
+    target = f"tcp://{host}:{port}"
+    if keep_alive and _tcp_accepting(host, port):
+        print(f"[server] reusing TCP mock on {host}:{port}")
+        run_read_suite(target)
+        return
+
+    server_cpu, client_cpu = cpu_pair()
+    proc = start_server_tcp(f"{host}:{port}", server_cpu)
+    saved_mask = pin_self(client_cpu)
     try:
-        time.sleep(0.5)
-        run_read_suite("tcp://127.0.0.1:1502")
+        wait_for_ready_line(proc, 6.0, "TCP mock server")
+        run_read_suite(target)
     finally:
-        kill_process(proc)
+        if keep_alive and proc.poll() is None:
+            print(f"[server] leaving TCP mock running (pid {proc.pid})")
+        else:
+            kill_process(proc)
+        # the serial modes must not inherit the single-CPU mask
+        restore_affinity(saved_mask)
 
 
 def test_serial(framing: str, scheme: str) -> None:
     socat_proc, dev_server, dev_client = start_socat_pair()
     proc = start_server_serial(dev_server, framing)
     try:
-        time.sleep(1.0)
+        wait_for_ready_line(proc, 8.0, f"{framing.upper()} mock server")
         run_read_suite(f"{scheme}://{dev_client}")
     finally:
         kill_process(proc)
@@ -315,7 +310,12 @@ def test_serial(framing: str, scheme: str) -> None:
     type=click.Choice(["tcp", "ascii", "rtu", "serial"], case_sensitive=False),
     help="Modes to run (serial expands to ascii+rtu). Default: all.",
 )
-def main(modes: tuple[str, ...]) -> int:
+@click.option(
+    "--keep-alive",
+    is_flag=True,
+    help="Reuse a TCP mock already listening on 127.0.0.1:1502 and leave it running afterwards.",
+)
+def main(modes: tuple[str, ...], keep_alive: bool) -> int:
     selected = {m.lower() for m in modes}
     if not selected:
         selected = {"tcp", "ascii", "rtu"}
@@ -323,13 +323,12 @@ def main(modes: tuple[str, ...]) -> int:
         selected.discard("serial")
         selected.update({"ascii", "rtu"})
 
-    _require_cmd("uv")
-    if not CLI.exists():
-        build_cli()
+    require_cmd("uv")
+    build_cli()
 
     try:
         if "tcp" in selected:
-            test_tcp()
+            test_tcp(keep_alive)
         if "ascii" in selected:
             test_serial("ascii", "ascii")
         if "rtu" in selected: